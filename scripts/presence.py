@@ -9,18 +9,21 @@ import sys
 import os
 import json
 import re
-import subprocess
 import time
 import atexit
 import signal
 from pathlib import Path
-from datetime import datetime
 
 # Shared state management (provides process-safe file locking)
 from state import (
     DATA_DIR,
     STATE_FILE,
+    PID_FILE,
+    LOG_FILE,
+    SESSIONS_FILE,
     StateLock,
+    StateWatcher,
+    state_file_signature,
     read_state,
     write_state,
     update_state,
@@ -28,6 +31,8 @@ from state import (
     read_state_unlocked,
     write_state_unlocked,
     format_tokens,
+    json_loads,
+    atomic_write_bytes,
 )
 
 # Optional YAML support for config file
@@ -43,14 +48,19 @@ _yaml_warning_logged = False
 # Discord Application ID
 DISCORD_APP_ID = "1330919293709324449"
 
-# Data files (DATA_DIR imported from state module)
-PID_FILE = DATA_DIR / "daemon.pid"
-LOG_FILE = DATA_DIR / "daemon.log"
-SESSIONS_FILE = DATA_DIR / "sessions.json"  # Tracks active session PIDs
+# Static Rich Presence fields, sent unchanged with every update
+PRESENCE_ASSETS = {
+    "large_image": "claude",
+    "large_text": "Claude Code",
+}
 
 # Orphan check interval (seconds) - how often daemon checks for dead sessions
 ORPHAN_CHECK_INTERVAL = 30
 
+# Display cycle (seconds): simple view for the first 5s, cached view for the last 3s
+DISPLAY_CYCLE = 8
+DISPLAY_SIMPLE_SECONDS = 5
+
 # Tool to display name mapping (keep short for Discord limit)
 ## Keep in sync with PreToolUse matcher in hooks/hooks.json
 TOOL_DISPLAY = {
@@ -102,20 +112,45 @@ FILE_TOOLS = {"Edit", "Write", "Read", "NotebookEdit", "NotebookRead"}
 
 
 _log_to_file_failed = False
+_log_file = None  # Opened on first log() call and kept open (line-buffered append)
+
+# Log timestamp cache - strftime only runs once per wall-clock second
+_log_ts_sec = 0
+_log_ts_str = ""
+
+
+def _close_log_file():
+    """Close the cached log handle, if any (also the single atexit hook)."""
+    global _log_file
+    if _log_file is not None:
+        try:
+            _log_file.close()
+        except OSError:
+            pass  # Flushing a failed handle can fail again - nothing left to do
+        _log_file = None
+
+
+atexit.register(_close_log_file)
 
 
 def log(message: str):
     """Append message to log file, with stderr fallback on failure."""
-    global _log_to_file_failed
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    formatted = f"[{timestamp}] {message}"
+    global _log_to_file_failed, _log_file, _log_ts_sec, _log_ts_str
+    now_sec = int(time.time())
+    if now_sec != _log_ts_sec:
+        _log_ts_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now_sec))
+        _log_ts_sec = now_sec
+    formatted = f"[{_log_ts_str}] {message}"
 
     try:
-        DATA_DIR.mkdir(parents=True, exist_ok=True)
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(formatted + "\n")
+        if _log_file is None:
+            DATA_DIR.mkdir(parents=True, exist_ok=True)
+            _log_file = open(LOG_FILE, "a", encoding="utf-8", buffering=1)
+        _log_file.write(formatted + "\n")
         return  # Success
     except OSError as e:
+        # Close and drop the handle so the next call retries opening the file
+        _close_log_file()
         # File logging failed - fall back to stderr
         if not _log_to_file_failed:
             _log_to_file_failed = True
@@ -216,7 +251,7 @@ def get_config(force_reload: bool = False) -> dict:
     """
     global _config_cache, _config_last_load
 
-    now = time.time()
+    now = time.monotonic()  # Interval math only - immune to wall-clock jumps
     if force_reload or _config_cache is None or (now - _config_last_load > CONFIG_RELOAD_INTERVAL):
         _config_cache = load_config()
         _config_last_load = now
@@ -255,7 +290,7 @@ def extract_file_from_tool_input(hook_input: dict) -> str:
         return ""
 
     try:
-        return Path(file_path).name
+        return os.path.basename(file_path)
     except (ValueError, OSError, TypeError) as e:
         log(f"Warning: Could not extract filename from '{file_path}': {e}")
         return ""
@@ -292,20 +327,19 @@ def truncate_filename(filename: str, max_length: int = 25) -> str:
 
 def get_daemon_pid() -> int | None:
     """Get PID of running daemon, or None if not running."""
-    if not PID_FILE.exists():
-        return None
+    pid_content = ""
     try:
-        pid_content = PID_FILE.read_text().strip()
+        with open(PID_FILE, "r") as f:
+            pid_content = f.read().strip()
         pid = int(pid_content)
         # Check if process is actually running
         if sys.platform == "win32":
-            result = subprocess.run(
-                ["tasklist", "/FI", f"PID eq {pid}", "/NH"],
-                capture_output=True, text=True
-            )
-            if str(pid) in result.stdout:
+            # OpenProcess probe (no tasklist subprocess) - same "any process" semantics as tasklist
+            if is_process_alive(pid):
                 return pid
         else:
+            # Not is_process_alive(): a stale PID reused by another user's process must
+            # count as "not our daemon", so PermissionError falls through to None below
             os.kill(pid, 0)  # Doesn't kill, just checks
             return pid
     except ValueError as e:
@@ -314,8 +348,8 @@ def get_daemon_pid() -> int | None:
             PID_FILE.unlink()
         except OSError:
             pass
-    except ProcessLookupError:
-        pass  # Process not running - normal case
+    except (FileNotFoundError, ProcessLookupError):
+        pass  # No PID file or process not running - normal case
     except (PermissionError, OSError) as e:
         log(f"Warning: Could not check daemon PID: {e}")
     return None
@@ -325,7 +359,8 @@ def write_pid():
     """Write current PID to file."""
     try:
         DATA_DIR.mkdir(parents=True, exist_ok=True)
-        PID_FILE.write_text(str(os.getpid()))
+        # Atomic so get_daemon_pid never reads a half-written (and "corrupt") PID
+        atomic_write_bytes(PID_FILE, str(os.getpid()).encode("ascii"))
     except OSError as e:
         log(f"Warning: Could not write PID file: {e}")
 
@@ -350,9 +385,10 @@ def get_project_name(project_path: str = "") -> str:
     if not project_path:
         project_path = os.environ.get("CLAUDE_PROJECT_DIR", os.getcwd())
 
-    folder_name = Path(project_path).name
+    folder_name = os.path.basename(project_path.rstrip("/\\"))
 
     # Try to get git remote origin URL
+    import subprocess  # Deferred: hook fast paths (update/status) never spawn processes
     try:
         result = subprocess.run(
             ["git", "-C", project_path, "remote", "get-url", "origin"],
@@ -379,6 +415,7 @@ def get_git_branch(project_path: str) -> str:
     """Get current git branch name."""
     if not project_path:
         return ""
+    import subprocess
     try:
         result = subprocess.run(
             ["git", "-C", project_path, "rev-parse", "--abbrev-ref", "HEAD"],
@@ -399,7 +436,8 @@ def is_process_alive(pid: int) -> bool:
     """Check if a process with given PID is still running."""
     if sys.platform == "win32":
         import ctypes
-        kernel32 = ctypes.windll.kernel32
+        # use_last_error so get_last_error() below reports OpenProcess's error
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
         # PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
         handle = kernel32.OpenProcess(0x1000, False, pid)
         if handle:
@@ -412,6 +450,10 @@ def is_process_alive(pid: int) -> bool:
             return True
         return False
     else:
+        # Linux fast path: /proc/<pid> exists while the process does. A miss falls
+        # through to kill() in case /proc isn't mounted (e.g. some containers)
+        if sys.platform.startswith("linux") and os.path.isdir(f"/proc/{pid}"):
+            return True
         try:
             os.kill(pid, 0)  # Doesn't kill, just checks
             return True
@@ -514,11 +556,13 @@ def get_session_pid() -> int:
 
 def read_sessions() -> dict:
     """Read active sessions {pid: timestamp}."""
-    if SESSIONS_FILE.exists():
-        try:
-            return json.loads(SESSIONS_FILE.read_text(encoding="utf-8"))
-        except (json.JSONDecodeError, OSError, UnicodeDecodeError) as e:
-            log(f"Warning: Could not read sessions file: {e}")
+    try:
+        with open(SESSIONS_FILE, "rb") as f:
+            return json_loads(f.read())
+    except FileNotFoundError:
+        pass  # No sessions yet - normal case
+    except (json.JSONDecodeError, OSError, UnicodeDecodeError) as e:
+        log(f"Warning: Could not read sessions file: {e}")
     return {}
 
 
@@ -589,7 +633,7 @@ def read_hook_input() -> dict:
         if not sys.stdin.isatty():
             data = sys.stdin.read()
             if data.strip():
-                return json.loads(data)
+                return json_loads(data)
     except (json.JSONDecodeError, OSError, UnicodeDecodeError) as e:
         log(f"Warning: Could not parse hook input: {e}")
     return {}
@@ -612,11 +656,28 @@ def run_daemon():
     app_id = config.get("discord_app_id") or DISCORD_APP_ID
     log(f"Using Discord App ID: {app_id}")
 
-    # Handle graceful shutdown
+    watcher = StateWatcher(listen_statusline=True)  # Wakes the loop on state changes
+    log("Watching state file for changes" if watcher.watches_file else "Polling state file (no change notifications)")
+
+    # Handle graceful shutdown: only flag it here and let the loop exit at a safe
+    # point, so a signal can't tear down the Discord socket mid-update. A plain bool
+    # (not threading.Event, whose lock the interrupted code may hold) and no logging,
+    # so the handler never re-enters anything the main thread was in the middle of
+    stopping = False
+
     def shutdown(signum, frame):
-        log("Received shutdown signal")
-        remove_pid()
-        sys.exit(0)
+        nonlocal stopping
+        stopping = True
+        watcher.wake()  # Cut the current wait short
+
+    def pause(seconds: float):
+        """Back off for seconds, still draining the watcher and ending early on shutdown."""
+        deadline = time.monotonic() + seconds
+        while not stopping:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            watcher.wait(remaining)
 
     signal.signal(signal.SIGTERM, shutdown)
     signal.signal(signal.SIGINT, shutdown)
@@ -625,13 +686,15 @@ def run_daemon():
     rpc = None
     connected = False
     current_app_id = app_id
-    last_sent = {}  # Track last sent state to avoid redundant updates
-    last_orphan_check = 0  # Track when we last checked for dead sessions
+    last_sent = ()  # (details, state_line) last sent - avoids redundant updates
+    last_state = {}  # Last parsed state, reused while the file is unchanged
+    last_state_signature = None
+    last_orphan_check = -ORPHAN_CHECK_INTERVAL  # Monotonic time of last dead-session check (first loop checks)
     discord_connect_attempts = 0  # Track connection retry attempts
     consecutive_errors = 0  # Track consecutive loop errors for circuit breaker
     MAX_CONSECUTIVE_ERRORS = 10  # Exit after this many consecutive failures
 
-    while True:
+    while not stopping:
         try:
             # Periodically reload config for hot-reload support
             config = get_config()
@@ -651,9 +714,9 @@ def run_daemon():
                 current_app_id = new_app_id
 
             # Periodically check for dead sessions (orphan cleanup)
-            now = time.time()
-            if now - last_orphan_check > ORPHAN_CHECK_INTERVAL:
-                last_orphan_check = now
+            tick = time.monotonic()
+            if tick - last_orphan_check > ORPHAN_CHECK_INTERVAL:
+                last_orphan_check = tick
                 active_count = cleanup_dead_sessions()
                 if active_count == 0:
                     log("No active sessions remaining, daemon exiting")
@@ -675,7 +738,7 @@ def run_daemon():
                         BrokenPipeError, TimeoutError, OSError) as e:
                     # Expected connection failures - retry
                     log(f"Failed to connect to Discord (attempt {discord_connect_attempts}/{DISCORD_CONNECT_MAX_RETRIES}): {e}")
-                    time.sleep(5)
+                    pause(5)
                     continue
                 except Exception as e:
                     # Unexpected error (likely a bug) - fail fast with traceback
@@ -683,11 +746,21 @@ def run_daemon():
                     log(f"FATAL: Unexpected error connecting to Discord: {e}\n{traceback.format_exc()}")
                     break
 
-            # Read current state (pass logger for error visibility)
-            state = read_state(log)
+            # Read current state (pass logger for error visibility), skipping the
+            # lock + unpickle when the file hasn't been rewritten since last time
+            signature = state_file_signature()
+            if signature is None:
+                state = {}
+            elif signature == last_state_signature:
+                state = last_state
+            else:
+                state = read_state(log)
+                last_state = state
+                # Don't cache failed/empty reads - retry on the next iteration
+                last_state_signature = signature if state else None
 
             if not state:
-                time.sleep(1)
+                watcher.wait(1)
                 continue
 
             # Get display settings from config
@@ -698,10 +771,12 @@ def run_daemon():
             show_branch = display_cfg.get("show_branch", True)
             show_file = display_cfg.get("show_file", False)
 
-            # Check for idle timeout - show "Idling" instead of clearing
+            # Check for idle timeout - show "Idling" instead of clearing.
+            # State timestamps are wall-clock ints written by other processes
+            now = int(time.time())
             last_update = state.get("last_update", 0)
             idle_timeout = config.get("idle_timeout", IDLE_TIMEOUT)
-            is_idle = time.time() - last_update > idle_timeout
+            is_idle = now - last_update > idle_timeout
 
             # Get state values
             tool = state.get("tool", "")
@@ -709,7 +784,7 @@ def run_daemon():
             git_branch = state.get("git_branch", "") if show_branch else ""
             model = state.get("model", "") if show_model else ""
             current_file = state.get("file", "") if show_file else ""
-            session_start = state.get("session_start", int(time.time()))
+            session_start = state.get("session_start", now)
 
             # Get token data (only if needed for display)
             tokens = state.get("tokens", {})
@@ -758,8 +833,8 @@ def run_daemon():
             # Cycle display between two views every 8 seconds:
             # - Simple (5s): input + output tokens, cost without cache consideration
             # - Cached (3s): total tokens including cache reads/writes
-            cycle_pos = int(time.time()) % 8
-            show_simple = cycle_pos < 5
+            cycle_pos = now % DISPLAY_CYCLE
+            show_simple = cycle_pos < DISPLAY_SIMPLE_SECONDS
 
             simple_tokens = input_tokens + output_tokens
             cached_tokens = input_tokens + output_tokens + cache_read + cache_write
@@ -785,7 +860,7 @@ def run_daemon():
             state_line = " \u2022 ".join(parts) if parts else "Claude Code"
 
             # Only update if something changed (check every cycle)
-            current = {"details": details, "state_line": state_line}
+            current = (details, state_line)
             if current != last_sent:
                 log(f"Sending to Discord: {details} | {state_line}")
                 try:
@@ -793,8 +868,7 @@ def run_daemon():
                         details=details,
                         state=state_line,
                         start=session_start,
-                        large_image="claude",
-                        large_text="Claude Code",
+                        **PRESENCE_ASSETS,
                     )
                     last_sent = current
                 except (ConnectionError, ConnectionResetError, BrokenPipeError,
@@ -810,7 +884,19 @@ def run_daemon():
                     # Don't disconnect - this might be a transient data issue
                     # Continue to next iteration to try again with fresh state
 
-            time.sleep(1)
+            # Sleep until the state file changes or the display needs refreshing on its own:
+            # the next simple/cached view flip, the idle transition, or the orphan check
+            wake_in = ORPHAN_CHECK_INTERVAL - (time.monotonic() - last_orphan_check)
+            wall_now = time.time()
+            if not is_idle:
+                wake_in = min(wake_in, last_update + idle_timeout + 1 - wall_now)
+            if show_tokens or show_cost:
+                pos = wall_now % DISPLAY_CYCLE
+                boundary = DISPLAY_SIMPLE_SECONDS if pos < DISPLAY_SIMPLE_SECONDS else DISPLAY_CYCLE
+                wake_in = min(wake_in, boundary - pos)
+            if rpc is None:
+                wake_in = min(wake_in, 1)  # Connection lost - retry soon
+            watcher.wait(max(wake_in, 0) + 0.05)  # Small margin so we land past the boundary
 
         except KeyboardInterrupt:
             break
@@ -823,7 +909,7 @@ def run_daemon():
             if consecutive_errors >= MAX_CONSECUTIVE_ERRORS:
                 log(f"ERROR: Too many consecutive errors ({consecutive_errors}), daemon exiting")
                 break
-            time.sleep(5)
+            pause(5)
         except Exception as e:
             # Unexpected errors (programming bugs) - log and exit to avoid infinite loop
             import traceback
@@ -834,12 +920,16 @@ def run_daemon():
             consecutive_errors = 0
 
     # Cleanup
+    if stopping:
+        log("Received shutdown signal")
+    watcher.close()
     if rpc:
         try:
             rpc.clear()
             rpc.close()
         except Exception as e:
             log(f"Warning: Error during RPC cleanup on shutdown: {e}")
+    remove_pid()
     log("Daemon stopped")
 
 
@@ -889,40 +979,26 @@ def cmd_start():
     # Spawn daemon in background
     log(f"Starting daemon for project: {project_name}")
 
+    import subprocess
     if sys.platform == "win32":
-        # Use pythonw if available for windowless execution
-        python_exe = sys.executable
-        script_path = Path(__file__).resolve()
-
-        try:
-            proc = subprocess.Popen(
-                [python_exe, str(script_path), "daemon"],
-                creationflags=subprocess.CREATE_NO_WINDOW | subprocess.DETACHED_PROCESS,
-                stdin=subprocess.DEVNULL,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-            )
-            log(f"Spawned daemon subprocess (PID {proc.pid})")
-        except OSError as e:
-            log(f"Failed to spawn daemon: {e}")
+        # Windowless, detached from the hook's console
+        spawn_kwargs = {"creationflags": subprocess.CREATE_NO_WINDOW | subprocess.DETACHED_PROCESS}
     else:
-        # Unix: fork and detach
-        try:
-            pid = os.fork()
-        except OSError as e:
-            log(f"Failed to fork daemon: {e}")
-            return
-        if pid == 0:
-            # Child process
-            os.setsid()
-            try:
-                sys.stdin.close()
-                sys.stdout.close()
-                sys.stderr.close()
-            except (OSError, ValueError):
-                pass
-            run_daemon()
-            sys.exit(0)
+        # Unix: exec a fresh interpreter in its own session (setsid) instead of
+        # fork()ing the hook process and running the daemon inside the copy
+        spawn_kwargs = {"start_new_session": True}
+
+    try:
+        proc = subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), "daemon"],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            **spawn_kwargs,
+        )
+        log(f"Spawned daemon subprocess (PID {proc.pid})")
+    except OSError as e:
+        log(f"Failed to spawn daemon: {e}")
 
 
 def cmd_update():
@@ -981,6 +1057,7 @@ def cmd_stop():
     # Kill daemon if running
     pid = get_daemon_pid()
     if pid:
+        import subprocess
         try:
             if sys.platform == "win32":
                 subprocess.run(["taskkill", "/F", "/PID", str(pid)],
@@ -1045,9 +1122,14 @@ def cmd_status():
         print("No active session")
 
 
+def cmd_export_json():
+    """Handle 'export-json' command - dump the raw (binary) state file as readable JSON."""
+    print(json.dumps(read_state(), indent=2, ensure_ascii=False))
+
+
 def main():
     if len(sys.argv) < 2:
-        print("Usage: presence.py <start|update|stop|status|daemon>")
+        print("Usage: presence.py <start|update|stop|status|export-json|daemon>")
         sys.exit(1)
 
     command = sys.argv[1]
@@ -1060,6 +1142,8 @@ def main():
         cmd_stop()
     elif command == "status":
         cmd_status()
+    elif command == "export-json":
+        cmd_export_json()
     elif command == "daemon":
         run_daemon()
     else:
@@ -3,11 +3,12 @@ Shared state management for Discord Rich Presence.
 Provides process-safe state file operations with cross-platform file locking.
 """
 
+import functools
 import json
 import os
-import shutil
+import select
+import socket
 import sys
-import tempfile
 import time
 from pathlib import Path
 
@@ -30,18 +31,83 @@ if sys.platform == "win32":
 else:
     DATA_DIR = Path.home() / ".local" / "share" / "cc-discord-rpc"
 
-STATE_FILE = DATA_DIR / "state.json"
+# All data files live here so both scripts agree on the layout
+STATE_FILE = DATA_DIR / "state.pkl"  # Binary (pickle) - use `presence.py export-json` to inspect
 LOCK_FILE = DATA_DIR / "state.lock"
+STATUSLINE_SOCKET = DATA_DIR / "statusline.sock"  # Daemon listens here (POSIX only)
+PID_FILE = DATA_DIR / "daemon.pid"
+LOG_FILE = DATA_DIR / "daemon.log"
+SESSIONS_FILE = DATA_DIR / "sessions.json"  # Tracks active session PIDs
+STATUSLINE_CACHE = DATA_DIR / "statusline.cache"  # Last rendered statusline (see statusline.py)
+
+# Rewrite the state file at least this often (seconds) even when statusline token
+# data is unchanged, so statusline_update stays fresh for other readers
+STATE_REFRESH_INTERVAL = 10
+
+# State keys statusline.py is allowed to update through STATUSLINE_SOCKET
+STATUSLINE_KEYS = ("model", "model_id", "tokens")
+
+# Compact JSON for hook/statusline input, sessions.json and statusline datagrams.
+# Deliberately stdlib: hooks and statusline.py are one-shot processes parsing
+# ~1KB, and importing orjson (~15-20ms) costs more than it saves there. The
+# long-lived daemon picks up orjson for datagrams instead (see StateWatcher).
+_encode_json_str = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+json_loads = json.loads
+
+
+def _encode_json(obj: dict) -> bytes:
+    return _encode_json_str(obj).encode("utf-8")
+
+
+# The state file is only ever read and written by these scripts, so it skips
+# JSON's text overhead and uses pickle. State holds nothing but builtins
+# (dict/list/str/int/float/bool/None), so loading refuses every global -
+# a tampered file can't make the unpickler import or call anything.
+# pickle is imported on first use: statusline.py's cache and socket paths never touch the file.
+@functools.cache
+def _state_unpickler():
+    import pickle
+
+    class _StateUnpickler(pickle.Unpickler):
+        def find_class(self, module, name):
+            raise pickle.UnpicklingError(f"Forbidden global in state file: {module}.{name}")
+
+    return _StateUnpickler
+
+
+def _encode_state(state: dict) -> bytes:
+    import pickle
+    return pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _decode_state(f) -> dict:
+    state = _state_unpickler()(f).load()
+    if not isinstance(state, dict):
+        raise ValueError(f"State file holds {type(state).__name__}, expected dict")
+    return state
+
+# Set once DATA_DIR is known to exist, so hot paths skip the mkdir syscall
+_data_dir_ready = False
+
+
+def _ensure_data_dir():
+    """Create DATA_DIR on first use; later calls are a no-op."""
+    global _data_dir_ready
+    if not _data_dir_ready:
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        _data_dir_ready = True
 
 
 # ═══════════════════════════════════════════════════════════════
 # Shared Utilities
 # ═══════════════════════════════════════════════════════════════
 
+@functools.lru_cache(maxsize=512)
 def format_tokens(count: int) -> str:
     """Format token count for display (e.g., 12.5k, 1.2M).
 
     Shared utility used by both presence.py and statusline.py.
+    Cached because the daemon re-formats the same slowly-changing counts every cycle.
     """
     if count >= 1_000_000:
         return f"{count / 1_000_000:.1f}M"
@@ -52,6 +118,50 @@ def format_tokens(count: int) -> str:
     return f"{count:,}"
 
 
+_O_NOATIME = getattr(os, "O_NOATIME", 0)
+
+
+def atomic_write_bytes(path: Path, data: bytes):
+    """
+    Replace path with data atomically, via a sibling "<name>.tmp" file.
+
+    Writes straight to a raw fd (no buffered/text wrapper for these tiny
+    payloads), then os.replace()s it into place - an atomic rename on both
+    POSIX and Windows, so readers never observe a partially written file.
+
+    The temp name is fixed: callers must ensure a single writer per path
+    (state file writes hold StateLock; only the daemon writes its PID file).
+    Raises OSError on failure, after removing the temp file.
+
+    These files are ephemeral coordination data rebuilt on the next session,
+    so they are deliberately never fsync()ed - losing them in a crash is fine.
+    """
+    tmp_path = f"{path}.tmp"
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+    try:
+        try:
+            # O_NOATIME (Linux) skips access-time inode updates on the temp file
+            fd = os.open(tmp_path, flags | _O_NOATIME, 0o600)
+        except PermissionError:
+            if not _O_NOATIME:
+                raise
+            # O_NOATIME needs file ownership - a leftover temp from another user lacks it
+            fd = os.open(tmp_path, flags, 0o600)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
 # ═══════════════════════════════════════════════════════════════
 # File Locking
 # ═══════════════════════════════════════════════════════════════
@@ -75,7 +185,7 @@ class StateLock:
         self._lock_fd = None
 
     def __enter__(self):
-        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        _ensure_data_dir()
         start = time.time()
 
         while True:
@@ -125,6 +235,348 @@ class StateLock:
         return False
 
 
+# ═══════════════════════════════════════════════════════════════
+# Change Notification
+# ═══════════════════════════════════════════════════════════════
+
+def _valid_statusline_update(update: dict) -> bool:
+    """Check value types before an update reaches the state file (the daemon sums tokens)."""
+    for key in ("model", "model_id"):
+        if key in update and not isinstance(update[key], str):
+            return False
+    tokens = update.get("tokens", {})
+    if not isinstance(tokens, dict):
+        return False
+    return all(
+        isinstance(value, (int, float)) and not isinstance(value, bool)
+        for value in tokens.values()
+    )
+
+
+class StateWatcher:
+    """
+    Blocks until the state file changes or a timeout elapses.
+
+    Usage:
+        watcher = StateWatcher(listen_statusline=True)
+        try:
+            while running:
+                ...
+                watcher.wait(timeout)
+        finally:
+            watcher.close()
+
+    Uses inotify on Linux (requires the optional inotify_simple package) and
+    directory change notifications on Windows. Falls back to plain sleeping
+    elsewhere, or if the notification handle cannot be created.
+
+    On POSIX, wake() (safe to call from a signal handler) makes a pending
+    wait() return immediately, so shutdown doesn't wait out the timeout.
+
+    With listen_statusline=True (POSIX only), also binds STATUSLINE_SOCKET and
+    merges token updates pushed by statusline.py into the state file, so the
+    statusline never has to take the lock or rewrite the state file itself.
+    """
+
+    # Win32 constants
+    _FILE_NOTIFY_CHANGE_FILE_NAME = 0x01
+    _FILE_NOTIFY_CHANGE_LAST_WRITE = 0x10
+    _WAIT_OBJECT_0 = 0
+
+    def __init__(self, listen_statusline: bool = False):
+        self._inotify = None
+        self._win_handle = None
+        self._kernel32 = None
+        self._socket = None
+        self._socket_id = None  # (st_dev, st_ino) of the bound STATUSLINE_SOCKET
+        self._wake_r = self._wake_w = None  # Self-pipe for wake() (POSIX only)
+        self._last_payload = None  # Last applied statusline datagram
+        self._last_applied = 0.0
+        try:
+            _ensure_data_dir()
+            if sys.platform == "win32":
+                self._open_win32()
+            else:
+                self._open_inotify()
+        except OSError as e:
+            print(f"[state] Warning: File change notifications unavailable, polling instead: {e}",
+                  file=sys.stderr)
+            self._close_notifications()
+
+        if listen_statusline and hasattr(socket, "AF_UNIX") and sys.platform != "win32":
+            try:
+                self._open_socket()
+            except OSError as e:
+                print(f"[state] Warning: Statusline socket unavailable, using state file: {e}",
+                      file=sys.stderr)
+                self._socket = None
+
+        if sys.platform != "win32":
+            self._wake_r, self._wake_w = os.pipe()
+            os.set_blocking(self._wake_r, False)
+            os.set_blocking(self._wake_w, False)
+
+    def _open_inotify(self):
+        # Optional dependency (Linux only), imported here so statusline.py doesn't pay for it
+        try:
+            from inotify_simple import INotify, flags
+        except ImportError:
+            return
+        self._inotify = INotify()
+        # os.replace() in write_state_unlocked shows up as MOVED_TO
+        self._inotify.add_watch(str(DATA_DIR), flags.CLOSE_WRITE | flags.MOVED_TO)
+
+    def _open_win32(self):
+        import ctypes
+        from ctypes import wintypes
+
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        kernel32.FindFirstChangeNotificationW.argtypes = [wintypes.LPCWSTR, wintypes.BOOL, wintypes.DWORD]
+        kernel32.FindFirstChangeNotificationW.restype = wintypes.HANDLE
+        kernel32.FindNextChangeNotification.argtypes = [wintypes.HANDLE]
+        kernel32.FindCloseChangeNotification.argtypes = [wintypes.HANDLE]
+        kernel32.WaitForSingleObject.argtypes = [wintypes.HANDLE, wintypes.DWORD]
+        kernel32.WaitForSingleObject.restype = wintypes.DWORD
+
+        handle = kernel32.FindFirstChangeNotificationW(
+            str(DATA_DIR), False,
+            self._FILE_NOTIFY_CHANGE_LAST_WRITE | self._FILE_NOTIFY_CHANGE_FILE_NAME,
+        )
+        if not handle or handle == ctypes.c_void_p(-1).value:
+            raise ctypes.WinError(ctypes.get_last_error())
+        self._kernel32 = kernel32
+        self._win_handle = handle
+
+    @staticmethod
+    def _datagram_loads():
+        # Optional orjson: worth its import cost only in the long-lived daemon.
+        # orjson.JSONDecodeError subclasses ValueError like the stdlib one
+        try:
+            import orjson
+            return orjson.loads
+        except ImportError:
+            return json_loads
+
+    @staticmethod
+    def _socket_identity():
+        st = os.stat(STATUSLINE_SOCKET)
+        return (st.st_dev, st.st_ino)
+
+    def _open_socket(self):
+        # A leftover socket may still belong to a live daemon - only remove it if
+        # nothing answers on it (connect() on a dead datagram socket is refused)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as probe:
+            try:
+                probe.connect(str(STATUSLINE_SOCKET))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                os.unlink(STATUSLINE_SOCKET)
+            else:
+                raise OSError(f"{STATUSLINE_SOCKET} is in use by another daemon")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        try:
+            sock.bind(str(STATUSLINE_SOCKET))
+            sock.setblocking(False)
+            self._socket_id = self._socket_identity()
+        except OSError:
+            sock.close()
+            raise
+        self._socket = sock
+        self._loads = self._datagram_loads()
+
+    @property
+    def watches_file(self) -> bool:
+        """True if state file writes wake wait(), False if the caller has to poll for them."""
+        # The statusline socket doesn't count: hooks still write the state file directly
+        return self._inotify is not None or self._win_handle is not None
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Wait up to timeout seconds for the state file to change.
+
+        Returns:
+            True if a change was observed, False on timeout (polling never sees file writes)
+        """
+        if not self.watches_file:
+            # Polling fallback: return at least every second so hook writes are picked up
+            timeout = min(timeout, 1.0)
+        deadline = time.monotonic() + max(timeout, 0.0)
+
+        if self._wake_r is not None:
+            # POSIX: the wake pipe is always watched, so this doubles as the polling sleep
+            sources = [src for src in (self._inotify, self._socket, self._wake_r) if src is not None]
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                readable, _, _ = select.select(sources, [], [], remaining)
+                if not readable:
+                    return False
+                if self._wake_r in readable:
+                    try:
+                        os.read(self._wake_r, 512)
+                    except BlockingIOError:
+                        pass
+                    return False
+                if self._socket in readable and self._drain_socket():
+                    return True
+                # Other files in DATA_DIR (daemon.log, sessions.json) also raise events;
+                # keep waiting until the state file itself is touched
+                if self._inotify in readable:
+                    for event in self._inotify.read(timeout=0):
+                        if event.name == STATE_FILE.name:
+                            return True
+
+        if self._win_handle is not None:
+            # Directory-level notification can't filter by name - use the file
+            # signature to tell state file changes apart from log/session writes
+            last_signature = state_file_signature()
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                result = self._kernel32.WaitForSingleObject(self._win_handle, max(1, int(remaining * 1000)))
+                if result != self._WAIT_OBJECT_0:
+                    return False
+                self._kernel32.FindNextChangeNotification(self._win_handle)
+                if state_file_signature() != last_signature:
+                    return True
+
+        time.sleep(max(timeout, 0.0))
+        return False
+
+    def _drain_socket(self) -> bool:
+        """Apply the newest queued statusline update. Returns True if state changed."""
+        payload = None
+        while True:
+            try:
+                payload = self._socket.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                print(f"[state] Warning: Statusline socket read failed: {e}", file=sys.stderr)
+                break
+        if payload is None:
+            return False
+
+        # Identical token data - skip the locked rewrite unless it's time for a refresh
+        now = time.monotonic()
+        if payload == self._last_payload and now - self._last_applied < STATE_REFRESH_INTERVAL:
+            return False
+
+        try:
+            decoded = self._loads(payload)
+        except ValueError as e:  # Includes (orjson.)JSONDecodeError
+            print(f"[state] Warning: Ignoring malformed statusline update: {e}", file=sys.stderr)
+            return False
+        if not isinstance(decoded, dict):
+            print(f"[state] Warning: Ignoring statusline update of type {type(decoded).__name__}",
+                  file=sys.stderr)
+            return False
+        # Only accept the fields statusline.py owns - never let a datagram clobber session keys
+        update = {key: decoded[key] for key in STATUSLINE_KEYS if key in decoded}
+        if not update:
+            return False
+        if not _valid_statusline_update(update):
+            print("[state] Warning: Ignoring statusline update with unexpected value types",
+                  file=sys.stderr)
+            return False
+
+        try:
+            with StateLock(timeout=1.0):
+                state = read_state_unlocked()
+                if not state.get("session_start"):  # Only update if session exists
+                    return False
+                state.update(update)
+                state["statusline_update"] = int(time.time())
+                write_state_unlocked(state)
+        except (OSError, TimeoutError) as e:
+            print(f"[state] Warning: Could not apply statusline update: {e}", file=sys.stderr)
+            return False
+
+        self._last_payload = payload
+        self._last_applied = now
+        return True
+
+    def wake(self):
+        """Interrupt a pending (or the next) wait(). No-op on Windows."""
+        if self._wake_w is not None:
+            try:
+                os.write(self._wake_w, b"\0")
+            except (BlockingIOError, OSError):
+                pass  # Pipe full means a wake-up is already pending
+
+    def _close_notifications(self):
+        if self._inotify is not None:
+            try:
+                self._inotify.close()
+            except OSError:
+                pass
+            self._inotify = None
+        if self._win_handle is not None:
+            self._kernel32.FindCloseChangeNotification(self._win_handle)
+            self._win_handle = None
+
+    def close(self):
+        self._close_notifications()
+        for fd in (self._wake_r, self._wake_w):
+            if fd is not None:
+                os.close(fd)
+        self._wake_r = self._wake_w = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            # Leave the path alone if another daemon has since bound its own socket there
+            try:
+                if self._socket_identity() == self._socket_id:
+                    os.unlink(STATUSLINE_SOCKET)
+            except OSError:
+                pass
+
+
+def send_statusline_update(update: dict) -> bool:
+    """
+    Push a statusline token update to the daemon's socket.
+
+    Never blocks: if the daemon isn't draining its socket (e.g. while it
+    retries the Discord connection) the queue fills up and the send fails.
+
+    Returns:
+        True if the daemon received it, False if the caller should write
+        the state file itself (no daemon listening, queue full, or platform
+        without AF_UNIX)
+    """
+    if sys.platform == "win32" or not hasattr(socket, "AF_UNIX"):
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)
+            sock.sendto(_encode_json(update), str(STATUSLINE_SOCKET))
+        return True
+    except OSError:
+        # FileNotFoundError / ConnectionRefusedError: daemon not running
+        # BlockingIOError: daemon busy, receive queue full
+        return False
+
+
+def state_file_signature() -> tuple | None:
+    """
+    Cheap change oracle for the state file (a single stat, no parsing).
+
+    Every write replaces the file, so the inode changes too - this catches
+    rewrites that land within the filesystem's mtime granularity.
+
+    Returns:
+        (inode, mtime_ns, size), or None if the file doesn't exist
+    """
+    try:
+        st = os.stat(STATE_FILE)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
 # ═══════════════════════════════════════════════════════════════
 # State Read/Write (Low-level, no locking)
 # ═══════════════════════════════════════════════════════════════
@@ -138,12 +590,17 @@ def read_state_unlocked() -> dict:
     Logs to stderr on corruption since this is a low-level function
     that may be called before presence.py logging is available.
     """
-    if STATE_FILE.exists():
-        try:
-            return json.loads(STATE_FILE.read_text(encoding="utf-8"))
-        except (json.JSONDecodeError, OSError, UnicodeDecodeError) as e:
-            # Log corruption to stderr - this is critical for debugging
-            print(f"[state] Warning: State file corrupt or unreadable: {e}", file=sys.stderr)
+    # Single open instead of exists() + read: one syscall fewer and no TOCTOU window
+    try:
+        with open(STATE_FILE, "rb") as f:
+            return _decode_state(f)
+    except FileNotFoundError:
+        pass  # No state yet - normal case
+    except Exception as e:
+        # A damaged pickle can fail in many ways (MemoryError, OverflowError,
+        # TypeError, ...) - none of them should take down the daemon or a hook.
+        # Log corruption to stderr - this is critical for debugging
+        print(f"[state] Warning: State file corrupt or unreadable: {e}", file=sys.stderr)
     return {}
 
 
@@ -152,21 +609,9 @@ def write_state_unlocked(state: dict):
     Write state to state file using atomic write pattern (no locking).
     Use write_state() or wrap with StateLock for safe access.
     """
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    content = json.dumps(state, indent=2)
-
-    fd, tmp_path = tempfile.mkstemp(dir=DATA_DIR, suffix='.tmp')
-    try:
-        with os.fdopen(fd, 'w', encoding='utf-8') as f:
-            f.write(content)
-        # shutil.move handles cross-platform atomic rename (including Windows overwrite)
-        shutil.move(tmp_path, STATE_FILE)
-    except (OSError, IOError):
-        try:
-            os.unlink(tmp_path)
-        except OSError:
-            pass
-        raise
+    _ensure_data_dir()
+    # Callers hold StateLock, so the fixed temp name in atomic_write_bytes is safe
+    atomic_write_bytes(STATE_FILE, _encode_state(state))
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -3,7 +3,7 @@
 Claude Code Statusline with Discord RPC Integration
 
 Displays a macOS Finder-style status bar showing model, tokens, cost, and git branch.
-Also updates state.json to provide token/cost data to the Discord RPC daemon.
+Also updates the shared state file to provide token/cost data to the Discord RPC daemon.
 
 Setup in ~/.claude/settings.json:
 {
@@ -16,11 +16,20 @@ Setup in ~/.claude/settings.json:
 import json
 import sys
 import os
+import time
 from pathlib import Path
-from datetime import datetime
 
 # Shared state management (provides process-safe file locking and utilities)
-from state import StateLock, read_state_unlocked, write_state_unlocked, format_tokens
+from state import (
+    STATUSLINE_CACHE,
+    STATE_REFRESH_INTERVAL,
+    StateLock,
+    read_state_unlocked,
+    write_state_unlocked,
+    send_statusline_update,
+    format_tokens,
+    json_loads,
+)
 
 # Fix Windows console encoding for Unicode characters
 if sys.platform == "win32":
@@ -107,6 +116,58 @@ def truncate(s: str, max_len: int) -> str:
 # Note: State management (read_state, write_state, StateLock) imported from state module
 # which provides process-safe file locking to prevent race conditions
 
+def update_state_file(update: dict):
+    """Merge statusline data into the state file (with file locking to prevent race conditions)."""
+    try:
+        with StateLock(timeout=1.0):  # Short timeout since statusline runs frequently
+            state = read_state_unlocked()
+            if not state.get("session_start"):  # Only update if session exists
+                return
+            now = int(time.time())
+            # Skip the rewrite when nothing changed (idle sessions tick every ~300ms)
+            unchanged = (
+                all(state.get(key) == value for key, value in update.items())
+                and now - state.get("statusline_update", 0) < STATE_REFRESH_INTERVAL
+            )
+            if not unchanged:
+                state.update(update)
+                state["statusline_update"] = now
+                write_state_unlocked(state)
+    except (OSError, TimeoutError) as e:
+        # Don't fail statusline display if state update fails
+        print(f"[statusline] Warning: Could not update state: {e}", file=sys.stderr)
+
+
+# STATUSLINE_CACHE holds the last rendered statusline, keyed on the input that produced it
+# (two lines: key, output). Entries expire after STATE_REFRESH_INTERVAL so branch switches
+# and new sessions show up
+
+def read_cached_statusline(key: str) -> str | None:
+    """Return the cached statusline for key, or None if missing, stale or for other input."""
+    try:
+        with open(STATUSLINE_CACHE, "r", encoding="utf-8") as f:
+            if time.time() - os.fstat(f.fileno()).st_mtime >= STATE_REFRESH_INTERVAL:
+                return None
+            cached_key, _, line = f.read().partition("\n")
+    except (OSError, UnicodeDecodeError):
+        return None
+    return line if cached_key == key else None
+
+
+def write_cached_statusline(key: str, line: str):
+    """Store the rendered statusline for the next invocation (best effort)."""
+    tmp_path = f"{STATUSLINE_CACHE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(f"{key}\n{line}")
+        os.replace(tmp_path, STATUSLINE_CACHE)
+    except OSError:
+        # Cache is optional - DATA_DIR may not exist before the first session
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
 
 # ═══════════════════════════════════════════════════════════════
 # Main
@@ -115,7 +176,7 @@ def truncate(s: str, max_len: int) -> str:
 def main():
     # Read JSON from stdin
     try:
-        data = json.load(sys.stdin)
+        data = json_loads(sys.stdin.buffer.read())
     except (json.JSONDecodeError, ValueError, UnicodeDecodeError, OSError) as e:
         print(f"[statusline] Error reading input: {e}", file=sys.stderr)
         print("")
@@ -139,28 +200,36 @@ def main():
     cache_write = current_usage.get("cache_creation_input_tokens", 0)
 
     cwd = data.get("workspace", {}).get("current_dir", os.getcwd())
+
+    # Idle sessions repeat the same input every tick - reuse the last rendered line
+    # and skip the git lookup and state update entirely (repr keeps the key on one line)
+    cache_key = repr((model, model_id, used_percent, total_input, total_output,
+                      cache_read, cache_write, round(cost, 4), cwd))
+    cached_line = read_cached_statusline(cache_key)
+    if cached_line is not None:
+        print(cached_line)
+        return
+
     git_branch = get_git_branch(cwd)
 
-    # Update state.json for Discord RPC (with file locking to prevent race conditions)
-    try:
-        with StateLock(timeout=1.0):  # Short timeout since statusline runs frequently
-            state = read_state_unlocked()
-            if state.get("session_start"):  # Only update if session exists
-                state["model"] = model
-                state["model_id"] = model_id
-                state["tokens"] = {
-                    "input": total_input,
-                    "output": total_output,
-                    "cache_read": cache_read,
-                    "cache_write": cache_write,
-                    "cost": cost,
-                    "simple_cost": cost,  # Claude Code provides pre-calculated cost
-                }
-                state["statusline_update"] = int(datetime.now().timestamp())
-                write_state_unlocked(state)
-    except (OSError, TimeoutError) as e:
-        # Don't fail statusline display if state update fails
-        print(f"[statusline] Warning: Could not update state: {e}", file=sys.stderr)
+    # Token data for the Discord RPC daemon
+    update = {
+        "model": model,
+        "model_id": model_id,
+        "tokens": {
+            "input": total_input,
+            "output": total_output,
+            "cache_read": cache_read,
+            "cache_write": cache_write,
+            "cost": cost,
+            "simple_cost": cost,  # Claude Code provides pre-calculated cost
+        },
+    }
+
+    # Prefer handing the update to the daemon over its socket (no lock, no file write);
+    # fall back to updating the state file directly if it isn't listening
+    if not send_statusline_update(update):
+        update_state_file(update)
 
     # ─────────────────────────────────────────────────────────────
     # Build Apple Finder Path Bar Statusline
@@ -198,6 +267,7 @@ def main():
     status_line = chevron.join(parts)
 
     print(status_line)
+    write_cached_statusline(cache_key, status_line)
 
 
 if __name__ == "__main__":